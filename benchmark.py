@@ -0,0 +1,424 @@
+# Benchmarks for main.py
+# Usage: python benchmark.py import-time [--runs N] [--budget-ms MS]
+#        python benchmark.py run [--suite encrypt] [--suite upload] [--output report.json] [--corpus-dir DIR]
+#        python benchmark.py compare old.json new.json [--threshold PCT]
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from termcolor import cprint
+
+try:
+    import resource
+except ImportError:  # Note: Not available on Windows, peak RSS is reported as null there
+    resource = None
+
+APP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ['PySimpleGUIWeb', 'pgpy', 'paramiko', 'yaml', 'cryptography', 'sqlite3', 'concurrent.futures']
+REPORT_VERSION = 1
+
+
+class ImportTimeBenchmark:
+    # Note: Each run is a fresh interpreter started outside the app directory with no config.yaml around,
+    # so a module-level config read or a heavy eager import shows up as a failure or a slow run.
+    PROBE = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+    ) % (HEAVY_MODULES,)
+
+    @staticmethod
+    def run_once(cwd):
+        env = dict(os.environ, PYTHONPATH=APP_DIRECTORY + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        env.pop('APP_CONFIG_FILE', None)
+        result = subprocess.run([sys.executable, '-c', ImportTimeBenchmark.PROBE], cwd=cwd, env=env, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"'import main' failed outside the app directory:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def run(args):
+        with tempfile.TemporaryDirectory() as cwd:
+            ImportTimeBenchmark.run_once(cwd)  # Note: Warm-up, fills the OS file cache and __pycache__
+            samples = [ImportTimeBenchmark.run_once(cwd) for _ in range(args.runs)]
+        timings_ms = [sample['seconds'] * 1000 for sample in samples]
+        loaded = sorted({module for sample in samples for module in sample['loaded']})
+        report = {
+            'benchmark': 'import-time',
+            'runs': args.runs,
+            'median_ms': round(statistics.median(timings_ms), 2),
+            'min_ms': round(min(timings_ms), 2),
+            'max_ms': round(max(timings_ms), 2),
+            'budget_ms': args.budget_ms,
+            'heavy_modules_loaded': loaded,
+        }
+        print(json.dumps(report, indent=2))
+        failed = False
+        if report['median_ms'] > args.budget_ms:
+            cprint(f"FAIL: 'import main' median {report['median_ms']} ms is over the {args.budget_ms} ms budget", 'red')
+            failed = True
+        if loaded:
+            cprint(f"FAIL: 'import main' eagerly loaded {', '.join(loaded)}", 'red')
+            failed = True
+        if not failed:
+            cprint(f"OK: 'import main' median {report['median_ms']} ms (budget {args.budget_ms} ms)", 'green')
+        return 1 if failed else 0
+
+
+class Corpus:
+    # Note: Synthetic CSV exports, seeded so every run (and every machine) benchmarks the same bytes.
+    # Rows mix ids, dates, amounts and a small vocabulary, which compresses roughly like our real exports.
+    HEADER = 'id,booked_at,account,amount,currency,counterparty,reference\n'
+    CURRENCIES = ['EUR', 'USD', 'GBP', 'CHF', 'SEK']
+    COUNTERPARTIES = ['ACME LTD', 'GLOBEX', 'INITECH', 'UMBRELLA', 'STARK IND', 'WAYNE ENT', 'HOOLI', 'VANDELAY']
+    DESCRIPTOR = 'corpus.json'
+
+    @staticmethod
+    def write_csv(filepath, size, rng):
+        with open(filepath, 'w', encoding='utf-8', newline='') as f:
+            f.write(Corpus.HEADER)
+            written = len(Corpus.HEADER)
+            row_id = 0
+            while written < size:
+                rows = []
+                for _ in range(256):
+                    row_id += 1
+                    rows.append(f"{row_id},2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00,"
+                                f"DE{rng.getrandbits(64):020d},{rng.randint(-500000, 500000) / 100:.2f},{rng.choice(Corpus.CURRENCIES)},"
+                                f"{rng.choice(Corpus.COUNTERPARTIES)},INV-{rng.getrandbits(24):08d}\n")
+                chunk = ''.join(rows)
+                f.write(chunk)
+                written += len(chunk)
+
+    @staticmethod
+    def params(args):
+        return {'seed': args.seed, 'small_files': args.small_files, 'small_kb': args.small_kb, 'large_files': args.large_files, 'large_mb': args.large_mb}
+
+    @staticmethod
+    def generate(corpus_dir, args):
+        # Note: Returns {'small': [...], 'large': [...]}, reusing corpus_dir when it already holds the same corpus
+        params = Corpus.params(args)
+        descriptor = os.path.join(corpus_dir, Corpus.DESCRIPTOR)
+        if os.path.exists(descriptor):
+            with open(descriptor, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            if existing['params'] == params:
+                return existing['sets']
+        rng = random.Random(args.seed)
+        sets = {'small': [], 'large': []}
+        for name, count, size in (('small', args.small_files, args.small_kb * 1024), ('large', args.large_files, args.large_mb * 1024 * 1024)):
+            set_dir = os.path.join(corpus_dir, name)
+            shutil.rmtree(set_dir, ignore_errors=True)
+            os.makedirs(set_dir)
+            for index in range(count):
+                filepath = os.path.join(set_dir, f"{name}_{index:05d}.csv")
+                Corpus.write_csv(filepath, size, rng)
+                sets[name].append(filepath)
+        with open(descriptor, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'sets': sets}, f)
+        return sets
+
+
+class BenchEnvironment:
+    # Note: Throwaway PGP recipient, SSH key and config.yaml so the suite never touches the real config, keys or manifest
+    @staticmethod
+    def create(work_dir, args):
+        import pgpy
+        import paramiko
+        import yaml
+        from pgpy.constants import PubKeyAlgorithm, KeyFlags, HashAlgorithm, SymmetricKeyAlgorithm, CompressionAlgorithm
+        key = pgpy.PGPKey.new(PubKeyAlgorithm.RSAEncryptOrSign, 2048)
+        key.add_uid(pgpy.PGPUID.new('Benchmark'), usage={KeyFlags.EncryptCommunications, KeyFlags.EncryptStorage},
+                    hashes=[HashAlgorithm.SHA256], ciphers=[SymmetricKeyAlgorithm.AES256],
+                    compression=[CompressionAlgorithm.ZIP, CompressionAlgorithm.ZLIB, CompressionAlgorithm.Uncompressed])
+        ssh_key_filepath = os.path.join(work_dir, 'id_rsa')
+        paramiko.RSAKey.generate(2048).write_private_key_file(ssh_key_filepath)
+        config = {
+            'Font': {'Common': ['Arial', 10], 'Header': ['Arial', 12]},
+            'Colors': {'CommonBG': 'white'},
+            'WindowSizes': {'Files': [40, 20], 'Dir': [40, 20], 'AddFiles': [40, 20], 'Logs': [40, 20]},
+            'Button': {'Size': [10, 1]},
+            'Theme': 'Default',
+            'SFTP': {'Hostname': '127.0.0.1', 'Port': 22, 'Username': 'benchmark', 'HostFilepath': '/'},
+            'FilePaths': {'ENCRYPTED_FILES_FOLDER': 'encrypted', 'PRIV_SSHKEY_FILEPATH': ssh_key_filepath},
+            'PGP_PUBLIC_KEY': str(key.pubkey),
+            'Encryption': {'Format': args.format, 'Compression': args.compression},
+            'Manifest': {'Filepath': os.path.join(work_dir, 'manifest.sqlite3')},
+        }
+        config_filepath = os.path.join(work_dir, 'config.yaml')
+        with open(config_filepath, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f)
+        return config_filepath
+
+
+class StandInProcess:
+    # Note: sftp_standin.py in its own process, so the server does not share the client's GIL and RSS
+    def __init__(self, root_dir):
+        self.process = subprocess.Popen([sys.executable, '-u', os.path.join(APP_DIRECTORY, 'sftp_standin.py'), root_dir, '0'],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        line = self.process.stdout.readline()
+        match = re.search(r':(\d+),', line)
+        if not match:
+            self.process.kill()
+            raise RuntimeError(f"SFTP stand-in did not start: {line!r}")
+        self.port = int(match.group(1))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+class NullLogWindow:
+    # Note: Log panes that drop everything, so the measurement is not a measurement of printing
+    def __getitem__(self, key):
+        return self
+
+    def update(self, value=None, append=True):
+        pass
+
+
+class Worker:
+    # Note: Runs one scenario inside a child process (`benchmark.py _worker ...`) so peak RSS and
+    # warm caches (parsed keys, open sessions) never carry over from one scenario to the next.
+    @staticmethod
+    def peak_rss_mb():
+        if resource is None:
+            return None, None
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # Note: ru_maxrss is bytes on macOS, KiB on Linux
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return round(own / 1048576, 1), round(children / 1048576, 1) if children else None
+
+    @staticmethod
+    def encrypt(args, main, filepaths):
+        out_dir = tempfile.mkdtemp(prefix='encrypted-', dir=args.work_dir)
+        start_time = time.perf_counter()
+        encrypted_files, failed_files = main.EncryptionUtils.encrypt_batch(filepaths, out_dir, NullLogWindow(), workers=args.workers)
+        elapsed_time = time.perf_counter() - start_time
+        encrypted_bytes = sum(os.path.getsize(f) for f in encrypted_files)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return elapsed_time, {'failed': len(failed_files), 'output_ratio': encrypted_bytes}
+
+    @staticmethod
+    def upload(args, main, filepaths):
+        main.CONFIG.SFTP_PORT = args.port
+        connect_start = time.perf_counter()
+        sessions = main.SFTP_SESSIONS.acquire(args.connections)
+        connect_seconds = time.perf_counter() - connect_start
+        try:
+            start_time = time.perf_counter()
+            failed_files = main.SFTPUtils.upload_files_concurrently(filepaths, sessions, NullLogWindow())
+            elapsed_time = time.perf_counter() - start_time
+        finally:
+            main.SFTP_SESSIONS.release(sessions)
+            main.SFTP_SESSIONS.close_all()
+        return elapsed_time, {'failed': len(failed_files), 'connect_seconds': round(connect_seconds, 3), 'sessions': len(sessions)}
+
+    @staticmethod
+    def run(args):
+        sys.path.insert(0, APP_DIRECTORY)
+        import main
+        main.CONFIG.load()
+        with open(args.files, 'r', encoding='utf-8') as f:
+            filepaths = json.load(f)
+        source_bytes = sum(os.path.getsize(f) for f in filepaths)
+        elapsed_time, extra = getattr(Worker, args.kind)(args, main, filepaths)
+        if 'output_ratio' in extra:
+            extra['output_ratio'] = round(extra['output_ratio'] / source_bytes, 4) if source_bytes else None
+        peak_rss_mb, peak_child_rss_mb = Worker.peak_rss_mb()
+        result = {
+            'seconds': round(elapsed_time, 4),
+            'files': len(filepaths),
+            'bytes': source_bytes,
+            'mb_per_second': round(source_bytes / 1048576 / elapsed_time, 2) if elapsed_time else None,
+            'files_per_second': round(len(filepaths) / elapsed_time, 1) if elapsed_time else None,
+            'ms_per_file': round(1000 * elapsed_time / len(filepaths), 3) if filepaths else None,
+            'peak_rss_mb': peak_rss_mb,
+            'peak_child_rss_mb': peak_child_rss_mb,
+        }
+        result.update(extra)
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return 0
+
+
+class SuiteBenchmark:
+    # Note: Higher is better for throughput, lower is better for time and memory. Used by `compare`.
+    COMPARED_METRICS = {'mb_per_second': 1, 'files_per_second': 1, 'ms_per_file': -1, 'peak_rss_mb': -1}
+
+    @staticmethod
+    def run_worker(args, kind, filepaths, env, work_dir, workers=1, connections=1, port=0):
+        files_list = os.path.join(work_dir, 'files.json')
+        result_file = os.path.join(work_dir, 'result.json')
+        with open(files_list, 'w', encoding='utf-8') as f:
+            json.dump(filepaths, f)
+        command = [sys.executable, os.path.abspath(__file__), '_worker', kind, '--files', files_list, '--result', result_file,
+                   '--work-dir', work_dir, '--workers', str(workers), '--connections', str(connections), '--port', str(port)]
+        output = None if args.verbose else subprocess.DEVNULL
+        subprocess.run(command, env=env, stdout=output, stderr=output, check=True)
+        with open(result_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def scenario(args, name, run):
+        # Note: Best of --repeat runs by wall time, the other runs only guard against a noisy first one
+        runs = []
+        for _ in range(args.repeat):
+            runs.append(run())
+        best = min(runs, key=lambda r: r['seconds'])
+        best['runs'] = len(runs)
+        cprint(f"{name}: {best['seconds']:.3f}s, {best['mb_per_second']} MB/s, {best['ms_per_file']} ms/file, peak RSS {best['peak_rss_mb']} MB", 'green')
+        return {'name': name, 'metrics': best}
+
+    @staticmethod
+    def git_commit():
+        try:
+            result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIRECTORY, capture_output=True, text=True, check=True)
+            dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=APP_DIRECTORY, capture_output=True, text=True, check=True)
+            return result.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '')
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def run(args):
+        suites = args.suite or ['encrypt', 'upload']
+        work_dir = tempfile.mkdtemp(prefix='pgp-benchmark-')
+        server = None
+        try:
+            corpus_dir = os.path.abspath(args.corpus_dir) if args.corpus_dir else os.path.join(work_dir, 'corpus')
+            os.makedirs(corpus_dir, exist_ok=True)
+            cprint(f"Preparing corpus in {corpus_dir}", 'white')
+            corpus = Corpus.generate(corpus_dir, args)
+            env = dict(os.environ, APP_CONFIG_FILE=BenchEnvironment.create(work_dir, args))
+            results = []
+            if 'encrypt' in suites:
+                for set_name in ('small', 'large'):
+                    for workers in sorted({1, args.workers}):
+                        results.append(SuiteBenchmark.scenario(args, f"encrypt/{set_name}/workers={workers}",
+                                                               lambda: SuiteBenchmark.run_worker(args, 'encrypt', corpus[set_name], env, work_dir, workers=workers)))
+            if 'upload' in suites:
+                server_root = os.path.join(work_dir, 'sftp_root')
+                server = StandInProcess(server_root)
+                for set_name in ('small', 'large'):
+                    for connections in sorted({1, args.connections}):
+                        def upload_run():
+                            shutil.rmtree(os.path.join(server_root, 'upload'), ignore_errors=True)
+                            os.makedirs(os.path.join(server_root, 'upload'))
+                            return SuiteBenchmark.run_worker(args, 'upload', corpus[set_name], env, work_dir, connections=connections, port=server.port)
+                        results.append(SuiteBenchmark.scenario(args, f"upload/{set_name}/connections={connections}", upload_run))
+            report = {
+                'report_version': REPORT_VERSION,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'git_commit': SuiteBenchmark.git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'settings': {'format': args.format, 'compression': args.compression, 'workers': args.workers,
+                             'connections': args.connections, 'repeat': args.repeat},
+                'corpus': Corpus.params(args),
+                'scenarios': results,
+            }
+        finally:
+            if server is not None:
+                server.stop()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            cprint(f"Report written to {args.output}", 'green')
+        else:
+            print(text)
+        return 0
+
+    @staticmethod
+    def compare(args):
+        # Note: Exits 1 when any compared metric got worse by more than --threshold percent
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.candidate, 'r', encoding='utf-8') as f:
+            candidate = json.load(f)
+        if baseline.get('corpus') != candidate.get('corpus') or baseline.get('settings') != candidate.get('settings'):
+            cprint("WARNING: corpus or settings differ between the reports, numbers are not directly comparable", 'yellow')
+        baseline_scenarios = {s['name']: s['metrics'] for s in baseline['scenarios']}
+        regressions = []
+        print(f"{'scenario':<34} {'metric':<17} {'baseline':>12} {'candidate':>12} {'change':>9}")
+        for scenario in candidate['scenarios']:
+            old = baseline_scenarios.get(scenario['name'])
+            if old is None:
+                continue
+            for metric, direction in SuiteBenchmark.COMPARED_METRICS.items():
+                old_value, new_value = old.get(metric), scenario['metrics'].get(metric)
+                if not old_value or new_value is None:
+                    continue
+                change = 100.0 * (new_value - old_value) / old_value
+                worse = change * direction < -args.threshold
+                color = 'red' if worse else ('green' if change * direction > args.threshold else 'white')
+                cprint(f"{scenario['name']:<34} {metric:<17} {old_value:>12} {new_value:>12} {change:>+8.1f}%", color)
+                if worse:
+                    regressions.append(f"{scenario['name']} {metric}")
+        if regressions:
+            cprint(f"FAIL: {len(regressions)} regression(s) over {args.threshold}%: {', '.join(regressions)}", 'red')
+            return 1
+        cprint(f"OK: no regression over {args.threshold}%", 'green')
+        return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmarks for main.py')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    import_time = subparsers.add_parser('import-time', help="Time 'import main' in a fresh interpreter and fail over budget")
+    import_time.add_argument('--runs', type=int, default=10)
+    import_time.add_argument('--budget-ms', type=float, default=100.0)
+    import_time.set_defaults(run=ImportTimeBenchmark.run)
+
+    suite = subparsers.add_parser('run', help='Encrypt and upload a synthetic CSV corpus and write a JSON report')
+    suite.add_argument('--suite', action='append', choices=['encrypt', 'upload'], help='Repeatable, defaults to both')
+    suite.add_argument('--output', help='Report file, printed to stdout when omitted')
+    suite.add_argument('--corpus-dir', help='Keep the generated corpus here and reuse it on later runs')
+    suite.add_argument('--seed', type=int, default=1)
+    suite.add_argument('--small-files', type=int, default=1000)
+    suite.add_argument('--small-kb', type=int, default=8)
+    suite.add_argument('--large-files', type=int, default=2)
+    suite.add_argument('--large-mb', type=int, default=64)
+    suite.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Encryption processes for the parallel scenarios')
+    suite.add_argument('--connections', type=int, default=4, help='SFTP sessions for the concurrent upload scenarios')
+    suite.add_argument('--format', choices=['armored', 'binary'], default='armored')
+    suite.add_argument('--compression', choices=['ZIP', 'ZLIB', 'BZ2', 'NONE'], default='ZIP')
+    suite.add_argument('--repeat', type=int, default=1, help='Runs per scenario, the fastest is reported')
+    suite.add_argument('--verbose', action='store_true', help='Show the output of the benchmark processes')
+    suite.set_defaults(run=SuiteBenchmark.run)
+
+    compare = subparsers.add_parser('compare', help='Compare two reports written by `run`')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--threshold', type=float, default=10.0, help='Percent a metric may get worse before failing')
+    compare.set_defaults(run=SuiteBenchmark.compare)
+
+    worker = subparsers.add_parser('_worker')  # Note: Internal, one scenario run in a child process
+    worker.add_argument('kind', choices=['encrypt', 'upload'])
+    worker.add_argument('--files', required=True)
+    worker.add_argument('--result', required=True)
+    worker.add_argument('--work-dir', required=True)
+    worker.add_argument('--workers', type=int, default=1)
+    worker.add_argument('--connections', type=int, default=1)
+    worker.add_argument('--port', type=int, default=0)
+    worker.set_defaults(run=Worker.run)
+    return parser
+
+
+if __name__ == '__main__':
+    arguments = build_parser().parse_args()
+    sys.exit(arguments.run(arguments))
@@ -0,0 +1,261 @@
+# In-process paramiko SFTP server backed by a local directory, for exercising SFTPUtils without a real host.
+# Usage: python sftp_standin.py <root_dir> [port]
+
+import os
+import hashlib
+import socket
+import sys
+import threading
+import paramiko
+
+
+class StandInServer(paramiko.ServerInterface):
+    # Note: Accepts any key or password, this is a local stand-in only
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'publickey,password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class StandInSFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            if attr._flags & attr.FLAG_SIZE:
+                os.truncate(self.filename, attr.st_size)
+                attr._flags &= ~attr.FLAG_SIZE
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class StandInSFTPSubsystem(paramiko.SFTPServer):
+    # Note: paramiko's own check-file handler adds the running count to the offset after every read, so digests past
+    # the first 64 KiB are wrong and a read past the end of the file loops forever. Same reply, correct offsets, sha256 too.
+    HASHES = {'sha256': hashlib.sha256, 'sha1': hashlib.sha1, 'md5': hashlib.md5}
+
+    def _check_file(self, request_number, msg):
+        handle = msg.get_binary()
+        alg_list = msg.get_list()
+        start = msg.get_int64()
+        length = msg.get_int64()
+        block_size = msg.get_int()
+        if handle not in self.file_table:
+            self._send_status(request_number, paramiko.SFTP_BAD_MESSAGE, 'Invalid handle')
+            return
+        f = self.file_table[handle]
+        algname = next((name for name in alg_list if name in StandInSFTPSubsystem.HASHES), None)
+        if algname is None:
+            self._send_status(request_number, paramiko.SFTP_FAILURE, 'No supported hash types found')
+            return
+        if length == 0:
+            length = f.stat().st_size - start
+        block_size = block_size or length
+        if block_size < 256:
+            self._send_status(request_number, paramiko.SFTP_FAILURE, 'Block size too small')
+            return
+        sum_out = b''
+        offset = start
+        while offset < start + length:
+            blocklen = min(block_size, start + length - offset)
+            hash_obj = StandInSFTPSubsystem.HASHES[algname]()
+            count = 0
+            while count < blocklen:
+                data = f.read(offset + count, min(blocklen - count, 65536))
+                if not isinstance(data, bytes):
+                    self._send_status(request_number, data, 'Unable to hash file')
+                    return
+                if not data:
+                    break
+                hash_obj.update(data)
+                count += len(data)
+            sum_out += hash_obj.digest()
+            offset += blocklen
+        reply = paramiko.Message()
+        reply.add_int(request_number)
+        reply.add_string('check-file')
+        reply.add_string(algname)
+        reply.add_bytes(sum_out)
+        self._send_packet(paramiko.sftp.CMD_EXTENDED_REPLY, reply)
+
+
+class StandInSFTPServer(paramiko.SFTPServerInterface):
+    ROOT = os.getcwd()
+
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = StandInSFTPServer.ROOT
+
+    def _realpath(self, path):
+        return self.root + self.canonicalize(path)
+
+    def list_folder(self, path):
+        path = self._realpath(path)
+        try:
+            entries = []
+            for name in os.listdir(path):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._realpath(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._realpath(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = self._realpath(path)
+        try:
+            fd = os.open(path, flags | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if (flags & os.O_CREAT) and (attr is not None):
+            attr._flags &= ~attr.FLAG_PERMISSIONS
+            paramiko.SFTPServer.set_file_attr(path, attr)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = StandInSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._realpath(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        oldpath, newpath = self._realpath(oldpath), self._realpath(newpath)
+        if os.path.exists(newpath):
+            return paramiko.SFTP_FAILURE
+        try:
+            os.rename(oldpath, newpath)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._realpath(oldpath), self._realpath(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        path = self._realpath(path)
+        try:
+            os.mkdir(path)
+            if attr is not None:
+                paramiko.SFTPServer.set_file_attr(path, attr)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._realpath(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        path = self._realpath(path)
+        try:
+            if attr._flags & attr.FLAG_SIZE:
+                # Note: paramiko's set_file_attr reopens with 'w+' which empties the file before truncating
+                os.truncate(path, attr.st_size)
+                attr._flags &= ~attr.FLAG_SIZE
+            paramiko.SFTPServer.set_file_attr(path, attr)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class LocalSFTPServer:
+    # Note: Serves root_dir on 127.0.0.1, an 'upload' folder is created to match the real host layout
+    def __init__(self, root_dir, port=0, host_key=None):
+        self.root_dir = os.path.abspath(root_dir)
+        os.makedirs(os.path.join(self.root_dir, 'upload'), exist_ok=True)
+        self.host_key = host_key or paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', port))
+        self.port = self.sock.getsockname()[1]
+        self.transports = []
+        self.thread = None
+
+    def start(self):
+        StandInSFTPServer.ROOT = self.root_dir
+        self.sock.listen(16)
+        self.thread = threading.Thread(target=self.serve, name='sftp-standin', daemon=True)
+        self.thread.start()
+        return self
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', StandInSFTPSubsystem, StandInSFTPServer)
+            transport.start_server(server=StandInServer())
+            self.transports.append(transport)
+
+    def stop(self):
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else '.'
+    server = LocalSFTPServer(root, int(sys.argv[2]) if len(sys.argv) > 2 else 2222).start()
+    print(f"Serving {server.root_dir} over SFTP on 127.0.0.1:{server.port}, Ctrl+C to stop")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,75 @@
+# Shared fixtures: a throwaway config.yaml with fresh PGP and SSH keys, so tests never touch the real config or manifest.
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def pgp_key():
+    import pgpy
+    from pgpy.constants import PubKeyAlgorithm, KeyFlags, HashAlgorithm, SymmetricKeyAlgorithm, CompressionAlgorithm
+    key = pgpy.PGPKey.new(PubKeyAlgorithm.RSAEncryptOrSign, 2048)
+    key.add_uid(pgpy.PGPUID.new('Tests'), usage={KeyFlags.EncryptCommunications, KeyFlags.EncryptStorage},
+                hashes=[HashAlgorithm.SHA256], ciphers=[SymmetricKeyAlgorithm.AES256],
+                compression=[CompressionAlgorithm.ZIP, CompressionAlgorithm.ZLIB, CompressionAlgorithm.BZ2, CompressionAlgorithm.Uncompressed])
+    return key
+
+
+@pytest.fixture(scope='session', autouse=True)
+def app_config(tmp_path_factory, pgp_key):
+    import paramiko
+    import yaml
+    work_dir = str(tmp_path_factory.mktemp('config'))
+    ssh_key_filepath = os.path.join(work_dir, 'id_rsa')
+    paramiko.RSAKey.generate(2048).write_private_key_file(ssh_key_filepath)
+    config = {
+        'Font': {'Common': ['Arial', 10], 'Header': ['Arial', 12]},
+        'Colors': {'CommonBG': 'white'},
+        'WindowSizes': {'Files': [40, 20], 'Dir': [40, 20], 'AddFiles': [40, 20], 'Logs': [40, 20]},
+        'Button': {'Size': [10, 1]},
+        'Theme': 'Default',
+        'SFTP': {'Hostname': '127.0.0.1', 'Port': 22, 'Username': 'tests', 'HostFilepath': '/'},
+        'FilePaths': {'ENCRYPTED_FILES_FOLDER': 'encrypted', 'PRIV_SSHKEY_FILEPATH': ssh_key_filepath},
+        'PGP_PUBLIC_KEY': str(pgp_key.pubkey),
+        'Manifest': {'Filepath': os.path.join(work_dir, 'manifest.sqlite3')},
+        'Logging': {'Filepath': os.path.join(work_dir, 'pgp_upload.log')},
+    }
+    config_filepath = os.path.join(work_dir, 'config.yaml')
+    with open(config_filepath, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+    os.environ['APP_CONFIG_FILE'] = config_filepath
+    return config_filepath
+
+
+@pytest.fixture
+def sftp_server(tmp_path, monkeypatch):
+    # Note: sftp_standin.py serving tmp_path/'server', uploads land in tmp_path/'server'/'upload'
+    import main
+    from sftp_standin import LocalSFTPServer
+    server = LocalSFTPServer(str(tmp_path / 'server')).start()
+    monkeypatch.setattr(main.CONFIG, 'SFTP_PORT', server.port)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def sftp(sftp_server):
+    import main
+    client, sftp = main.SFTPUtils.open_sftp_connection()
+    yield sftp
+    sftp.close()
+    client.close()
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    # Note: A fresh SpoolManager on tmp_path/'spool', the cap and delete settings are left to the test
+    import main
+    spool_dir = tmp_path / 'spool'
+    spool_dir.mkdir()
+    monkeypatch.setattr(main.CONFIG, 'SPOOL_DIRECTORY', str(spool_dir))
+    monkeypatch.setattr(main, 'SPOOL', main.SpoolManager())
+    return spool_dir
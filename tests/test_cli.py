@@ -0,0 +1,105 @@
+import os
+import pytest
+import main
+
+
+def make_csv(path, text='id,value\n1,2\n'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_recursive_sync_names_by_folder_passed(tmp_path, sftp_server):
+    data_dir = tmp_path / 'data'
+    make_csv(data_dir / '02' / 'f1.csv', 'id,value\n2,2\n')
+    output_dir = tmp_path / 'out'
+    # Note: Only one subfolder has files today, the name must still carry it
+    assert main.BatchCLI.run(['sync', '-r', str(data_dir), '-o', str(output_dir)]) == main.BatchCLI.EXIT_OK
+    make_csv(data_dir / '01' / 'f1.csv', 'id,value\n1,1\n')
+    assert main.BatchCLI.run(['sync', '-r', str(data_dir), '-o', str(output_dir)]) == main.BatchCLI.EXIT_OK
+    remote_files = sorted(os.listdir(tmp_path / 'server' / 'upload'))
+    assert remote_files == ['01__f1.csv.pgp', '02__f1.csv.pgp', 'SHA256SUMS']
+
+
+def test_expand_paths_roots(tmp_path):
+    make_csv(tmp_path / 'data' / 'a' / 'f1.csv')
+    make_csv(tmp_path / 'data' / 'b' / 'f1.csv')
+    single = make_csv(tmp_path / 'other' / 'g.csv')
+    filepaths, roots = main.BatchCLI.expand_paths([str(tmp_path / 'data'), str(single)], main.FileUtils.is_valid_file, recursive=True)
+    assert sorted(os.path.relpath(f, tmp_path) for f in filepaths) == [os.path.join('data', 'a', 'f1.csv'), os.path.join('data', 'b', 'f1.csv'), os.path.join('other', 'g.csv')]
+    assert roots == [str(tmp_path / 'data'), str(tmp_path / 'other')]
+
+
+def test_upload_prints_the_result_of_each_file(tmp_path, sftp_server, capsys):
+    encrypted_file = tmp_path / 'f1.csv.pgp'
+    encrypted_file.write_bytes(os.urandom(1000))
+    assert main.BatchCLI.run(['upload', str(encrypted_file)]) == main.BatchCLI.EXIT_OK
+    out = capsys.readouterr().out
+    assert '### SFTP UPLOAD RESULT ###' in out
+    assert f"LOCAL FILE: {encrypted_file}" in out
+    assert 'LOCAL FILESIZE: ' in out
+
+
+def bad_config(tmp_path, app_config, missing=(), **sections):
+    # Note: The test config with some sections dropped or merged with new values, loaded by its own AppConfig
+    import yaml
+    with open(app_config, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    for section in missing:
+        del config[section]
+    for section, values in sections.items():
+        config[section] = dict(config.get(section) or {}, **values) if isinstance(values, dict) else values
+    config_filepath = tmp_path / 'config.yaml'
+    config_filepath.write_text(yaml.safe_dump(config))
+    return main.AppConfig(str(config_filepath))
+
+
+def test_config_converts_settings_and_fills_defaults(tmp_path, app_config):
+    config = bad_config(tmp_path, app_config, SFTP={'Verify': 'COMMAND', 'Connections': '2'}, Encryption={'Compression': 'zlib'})
+    assert config.SFTP_VERIFY == 'command'
+    assert config.SFTP_CONNECTIONS == 2
+    assert config.ENCRYPTION_COMPRESSION == 'ZLIB'
+    assert config.SFTP_RESUMABLE is True
+    assert config.SPOOL_MAX_BYTES is None
+    assert config.PGP_PUBLIC_KEY == (config.load()['PGP_PUBLIC_KEY'][0],)
+
+
+def test_config_reports_every_invalid_setting(tmp_path, app_config):
+    config = bad_config(tmp_path, app_config, missing=('Theme',), SFTP={'Connections': 0, 'Resumable': 'yes', 'Verify': 'md5'})
+    with pytest.raises(main.ConfigError) as error:
+        config.load()
+    message = str(error.value)
+    assert 'SFTP.Connections: expected a positive number, got 0' in message
+    assert "SFTP.Resumable: expected true or false, got 'yes'" in message
+    assert "SFTP.Verify: expected size, check-file or command, got 'md5'" in message
+    assert 'Theme is missing' in message
+    assert config.values is None  # Note: Nothing half-loaded is cached, the next access raises again
+
+
+def test_cli_exit_code_for_a_bad_config(tmp_path, app_config, monkeypatch):
+    monkeypatch.setattr(main, 'CONFIG', bad_config(tmp_path, app_config, SFTP={'Port': 'twenty-two'}))
+    make_csv(tmp_path / 'data' / 'f1.csv')
+    assert main.BatchCLI.run(['encrypt', str(tmp_path / 'data')]) == main.BatchCLI.EXIT_CONFIG
+
+
+def test_cli_exit_code_when_no_files_match(tmp_path):
+    make_csv(tmp_path / 'data' / 'f1.txt')
+    assert main.BatchCLI.run(['sync', str(tmp_path / 'data'), str(tmp_path / 'missing.csv')]) == main.BatchCLI.EXIT_USAGE
+
+
+def test_cli_exit_code_when_the_server_is_unreachable(tmp_path, monkeypatch):
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]  # Note: Nothing listens here once the socket is closed
+    monkeypatch.setattr(main.CONFIG, 'SFTP_PORT', port)
+    make_csv(tmp_path / 'data' / 'f1.csv')
+    assert main.BatchCLI.run(['sync', str(tmp_path / 'data'), '-o', str(tmp_path / 'out')]) == main.BatchCLI.EXIT_CONNECTION
+
+
+def test_cli_exit_code_when_a_file_fails(tmp_path, sftp_server):
+    make_csv(tmp_path / 'data' / 'f1.csv')
+    make_csv(tmp_path / 'data' / 'f2.csv')
+    (tmp_path / 'server' / 'upload' / 'f2.csv.pgp').mkdir(parents=True)  # Note: The upload cannot be renamed over a folder
+    assert main.BatchCLI.run(['sync', str(tmp_path / 'data'), '-o', str(tmp_path / 'out')]) == main.BatchCLI.EXIT_FAILURES
+    assert os.path.isfile(tmp_path / 'server' / 'upload' / 'f1.csv.pgp')
@@ -0,0 +1,133 @@
+import os
+import random
+import pgpy
+import pytest
+import main
+
+
+class NullLogWindow:
+    def __getitem__(self, key):
+        return self
+
+    def update(self, value=None, append=True):
+        pass
+
+
+def csv_text(size):
+    # Note: Text like the exports this tool is used for, with enough noise that compression does not collapse it
+    rng = random.Random(size)
+    lines, total = [], 0
+    while total < size:
+        line = f"{rng.randint(0, 10 ** 9)},{rng.random():.12f},row-{len(lines)}\r\n"
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)[:size]
+
+
+@pytest.mark.parametrize('armored', [True, False], ids=['armored', 'binary'])
+@pytest.mark.parametrize('compression', ['ZIP', 'ZLIB', 'BZ2', 'NONE'])
+@pytest.mark.parametrize('size', [0, 1000, 200 * 1024 + 7])
+def test_stream_round_trip(tmp_path, pgp_key, armored, compression, size):
+    text = csv_text(size)
+    source_filepath = tmp_path / 'source.csv'
+    source_filepath.write_bytes(text.encode('utf-8'))
+    encrypted_filepath = tmp_path / 'source.csv.pgp'
+    # Note: A small read size so the larger file crosses several partial body chunks and CRC blocks
+    hashes = main.PGPStreamUtils.encrypt_stream(str(source_filepath), str(encrypted_filepath), [pgp_key.pubkey], 16 * 1024,
+                                                armored, compression)
+    encrypted = encrypted_filepath.read_bytes()
+    assert encrypted.startswith(b'-----BEGIN PGP MESSAGE-----') == armored
+    message = pgpy.PGPMessage.from_blob(encrypted.decode('ascii') if armored else encrypted)
+    decrypted = pgp_key.decrypt(message).message
+    assert (decrypted if isinstance(decrypted, str) else bytes(decrypted).decode('utf-8')) == text
+    assert hashes['sha256'] == main.FileUtils.sha256_file(str(source_filepath))
+    assert hashes['encrypted_sha256'] == main.FileUtils.sha256_file(str(encrypted_filepath))
+
+
+def test_armor_crc_matches_table():
+    data = os.urandom(3 * main.ArmorWriter.CRC24_BLOCK + 5)
+    expected = main.ArmorWriter.CRC24_INIT
+    with open(os.devnull, 'wb') as devnull:
+        writer = main.ArmorWriter(devnull)
+        for byte in data:
+            expected = ((expected << 8) & 0xFFFFFF) ^ main.ArmorWriter.CRC24_TABLE[(expected >> 16) ^ byte]
+        for start, end in [(0, 10), (10, 5000), (5000, len(data))]:
+            writer.update_crc(data[start:end])
+    assert writer.crc == expected
+
+
+class CancellingLogWindow:
+    # Note: Cancels the job as soon as the first encrypted file is logged
+    def __init__(self, job):
+        self.job = job
+
+    def __getitem__(self, key):
+        return self
+
+    def update(self, value=None, append=True):
+        if 'ENCRYPTED FILE' in str(value):
+            self.job.cancel()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_cancel_keeps_finished_files(tmp_path, workers):
+    filepaths = []
+    for index in range(6):
+        filepath = tmp_path / f'file{index}.csv'
+        filepath.write_text(csv_text(5000))
+        filepaths.append(str(filepath))
+    encrypted_dir = tmp_path / 'encrypted'
+    encrypted_dir.mkdir()
+    job = main.Job(1, 'encrypt')
+    encrypted_files, failed_files = main.EncryptionUtils.encrypt_batch(filepaths, str(encrypted_dir), CancellingLogWindow(job), workers=workers, job=job)
+    assert encrypted_files
+    assert sorted(os.listdir(encrypted_dir)) == sorted([os.path.basename(f) for f in encrypted_files] + ['SHA256SUMS'])
+    for encrypted_filepath in encrypted_files:
+        assert main.CHECKSUMS.lookup(encrypted_filepath) == main.FileUtils.sha256_file(encrypted_filepath)
+        assert main.MANIFEST.execute("SELECT * FROM files WHERE encrypted_path = ?", (os.path.abspath(encrypted_filepath),))
+    assert [reason for _, reason in failed_files] == ['Cancelled'] * (len(filepaths) - len(encrypted_files))
+    assert job.done == job.total == len(filepaths)
+
+
+def test_spool_rereads_folder_before_refusing(tmp_path, spool, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SPOOL_MAX_BYTES', 100000)
+    monkeypatch.setattr(main.CONFIG, 'ENCRYPTION_FORMAT', 'binary')
+    leftover = spool / 'old.csv.gpg'
+    leftover.write_bytes(b'x' * 90000)
+    source = tmp_path / 'new.csv'
+    source.write_bytes(b'y' * 30000)
+    assert main.SPOOL.used() == 90000
+    assert main.SPOOL.reserve(str(source)) is False
+    leftover.unlink()  # Note: Emptied by an operator while the app keeps running
+    assert main.SPOOL.reserve(str(source)) is True
+    assert main.SPOOL.used() == 30000
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_spool_encrypt_only_checks_real_sizes(tmp_path, spool, monkeypatch, workers):
+    # Note: Six 40 KB CSVs compress to a few KB each, their armored estimates alone would be 320 KB
+    monkeypatch.setattr(main.CONFIG, 'SPOOL_MAX_BYTES', 100000)
+    filepaths = []
+    for index in range(6):
+        filepath = tmp_path / f'file{index}.csv'
+        filepath.write_text(f'id,name,value\n{index},same row again,12345\n' * 1000)
+        filepaths.append(str(filepath))
+    encrypted_files, failed_files = main.EncryptionUtils.encrypt_batch(filepaths, str(spool), NullLogWindow(), workers=workers)
+    assert failed_files == []
+    assert len(encrypted_files) == 6
+    assert main.SPOOL.used() == sum(os.path.getsize(f) for f in encrypted_files)
+
+
+def test_spool_encrypt_only_fails_what_does_not_fit(tmp_path, spool, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SPOOL_MAX_BYTES', 10000)
+    monkeypatch.setattr(main.CONFIG, 'ENCRYPTION_FORMAT', 'binary')
+    monkeypatch.setattr(main.CONFIG, 'ENCRYPTION_COMPRESSION', 'NONE')
+    filepaths = []
+    for index in range(3):
+        filepath = tmp_path / f'file{index}.csv'
+        filepath.write_bytes(os.urandom(4000))
+        filepaths.append(str(filepath))
+    encrypted_files, failed_files = main.EncryptionUtils.encrypt_batch(filepaths, str(spool), NullLogWindow(), workers=1)
+    assert len(encrypted_files) == 2
+    assert [filepath for filepath, _ in failed_files] == filepaths[2:]
+    assert failed_files[0][1].startswith('Spool full')
@@ -0,0 +1,181 @@
+import os
+import subprocess
+import threading
+import paramiko
+import pytest
+import main
+
+CHUNK_SIZE = 256 * 1024  # Note: Over 64 KiB, where check-file handlers have to read a block in several pieces
+
+
+def resume(local_file_path, sftp):
+    # Note: In a thread with a deadline, a check-file handler that never answers fails the test instead of hanging it
+    result = {}
+
+    def run():
+        try:
+            result['value'] = main.SFTPUtils.resumable_put(local_file_path, 'data.pgp', sftp)
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "resumable_put did not finish"
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+@pytest.fixture
+def local_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SFTP_RESUME_CHUNK_SIZE', CHUNK_SIZE)
+    local_file_path = tmp_path / 'data.pgp'
+    local_file_path.write_bytes(os.urandom(16 * CHUNK_SIZE + 1000))
+    return local_file_path
+
+
+def server_files(tmp_path):
+    return sorted(os.listdir(tmp_path / 'server' / 'upload'))
+
+
+def test_resume_truncated_part(tmp_path, local_file, sftp):
+    data = local_file.read_bytes()
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(data[:5 * CHUNK_SIZE + 300])
+    offset, remote_attrs, _ = resume(str(local_file), sftp)
+    assert offset == 5 * CHUNK_SIZE + 300
+    assert remote_attrs.st_size == len(data)
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == data
+    assert server_files(tmp_path) == ['data.pgp']
+
+
+def test_resume_corrupted_part(tmp_path, local_file, sftp):
+    data = bytearray(local_file.read_bytes())
+    corrupted = bytearray(data)
+    corrupted[9 * CHUNK_SIZE + 10] ^= 0xFF
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(bytes(corrupted[:12 * CHUNK_SIZE]))
+    offset, _, _ = resume(str(local_file), sftp)
+    assert offset == 9 * CHUNK_SIZE  # Note: Resent from the start of the bad chunk
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == bytes(data)
+    assert server_files(tmp_path) == ['data.pgp']
+
+
+def test_resume_part_longer_than_local(tmp_path, local_file, sftp):
+    data = local_file.read_bytes()
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(data + b'stale tail')
+    offset, remote_attrs, _ = resume(str(local_file), sftp)
+    assert offset == len(data)
+    assert remote_attrs.st_size == len(data)
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == data
+
+
+
+@pytest.fixture
+def no_check_file(monkeypatch):
+    # Note: Like OpenSSH, no check-file extension. Returns the bytes read back from the server, in a list
+    def check(self, hash_algorithm, offset=0, length=0, block_size=0):
+        raise IOError("Operation unsupported")
+
+    read_back = [0]
+
+    def read(self, size=None, read=paramiko.SFTPFile.read):
+        data = read(self, size)
+        read_back[0] += len(data)
+        return data
+
+    monkeypatch.setattr(paramiko.SFTPFile, 'check', check)
+    monkeypatch.setattr(paramiko.SFTPFile, 'read', read)
+    return read_back
+
+
+def test_resume_without_check_file_reads_back_the_last_chunk(tmp_path, local_file, sftp, no_check_file):
+    data = local_file.read_bytes()
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(data[:5 * CHUNK_SIZE + 300])
+    offset, _, _ = resume(str(local_file), sftp)
+    assert offset == 5 * CHUNK_SIZE + 300
+    assert no_check_file[0] == 300
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == data
+
+
+def test_resume_without_check_file_resends_a_bad_last_chunk(tmp_path, local_file, sftp, no_check_file):
+    data = local_file.read_bytes()
+    corrupted = bytearray(data[:6 * CHUNK_SIZE])
+    corrupted[-1] ^= 0xFF
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(bytes(corrupted))
+    offset, _, _ = resume(str(local_file), sftp)
+    assert offset == 5 * CHUNK_SIZE
+    assert no_check_file[0] == CHUNK_SIZE
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == data
+
+
+def test_resume_read_back_checks_every_chunk(tmp_path, local_file, sftp, no_check_file, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SFTP_RESUME_READ_BACK', True)
+    data = local_file.read_bytes()
+    corrupted = bytearray(data[:12 * CHUNK_SIZE])
+    corrupted[9 * CHUNK_SIZE + 10] ^= 0xFF
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(bytes(corrupted))
+    offset, _, _ = resume(str(local_file), sftp)
+    assert offset == 9 * CHUNK_SIZE
+    assert no_check_file[0] == 10 * CHUNK_SIZE
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == data
+
+
+def test_resume_with_verify_command_hashes_chunks_on_the_server(tmp_path, local_file, sftp, no_check_file, monkeypatch):
+    # Note: The stand-in has no exec channel, the command runs here against the served folder
+    monkeypatch.setattr(main.CONFIG, 'SFTP_VERIFY', 'command')
+    commands = []
+
+    def run_remote_command(sftp, command):
+        commands.append(command)
+        result = subprocess.run(['sh', '-c', command.replace(' if=/', f" if={tmp_path / 'server'}/")], capture_output=True)
+        return result.stdout.decode() if result.returncode == 0 else None
+
+    monkeypatch.setattr(main.SFTPUtils, 'run_remote_command', staticmethod(run_remote_command))
+    data = local_file.read_bytes()
+    corrupted = bytearray(data[:12 * CHUNK_SIZE + 300])
+    corrupted[9 * CHUNK_SIZE + 10] ^= 0xFF
+    (tmp_path / 'server' / 'upload' / 'data.pgp.part').write_bytes(bytes(corrupted))
+    offset, _, _ = resume(str(local_file), sftp)
+    assert offset == 9 * CHUNK_SIZE
+    assert len(commands) == 1
+    assert no_check_file[0] == 0  # Note: The trailing 300 bytes are never reached, chunk 9 already differs
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == data
+
+
+class NullLogWindow:
+    def __getitem__(self, key):
+        return self
+
+    def update(self, value=None, append=True):
+        pass
+
+
+def test_retry_after_dropped_session_resumes(tmp_path, local_file, sftp_server, monkeypatch):
+    # Note: The stat cache is loaded at the start of the batch, before the partial file exists
+    session = main.SFTPUtils.open_sftp_connection()
+    offsets, sent = [], [0]
+    resumable_put = main.SFTPUtils.resumable_put
+
+    def recording_put(*args, **kwargs):
+        offset, remote_attrs, verified = resumable_put(*args, **kwargs)
+        offsets.append(offset)
+        return offset, remote_attrs, verified
+
+    def dropping_add(stats, count, add=main.TransferStats.add):
+        add(stats, count)
+        if stats.parent is not None:
+            sent[0] += count
+            if sent[0] >= 8 * CHUNK_SIZE and main.SFTPUtils.is_session_alive(session):
+                session[0].get_transport().close()
+
+    monkeypatch.setattr(main.SFTPUtils, 'resumable_put', staticmethod(recording_put))
+    monkeypatch.setattr(main.TransferStats, 'add', dropping_add)
+    sessions = [session]
+    failed_files = main.SFTPUtils.upload_files_concurrently([str(local_file)], sessions, NullLogWindow(),
+                                                             reconnect=main.SFTPUtils.open_sftp_connection)
+    assert failed_files == []
+    assert len(offsets) == 1 and offsets[0] > 0  # Note: Only the retry returns, from where the dropped attempt stopped
+    assert (tmp_path / 'server' / 'upload' / 'data.pgp').read_bytes() == local_file.read_bytes()
+    for client, sftp in sessions:
+        sftp.close()
+        client.close()
@@ -0,0 +1,42 @@
+import time
+import main
+
+
+def test_idle_sessions_are_reused_then_closed(sftp_server, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SFTP_IDLE_TIMEOUT', 1)
+    manager = main.SFTPSessionManager()
+    sessions = manager.acquire(2)
+    manager.release(sessions)
+    reused = manager.acquire(1)
+    assert reused[0] in sessions
+    assert manager.stats()['reuses'] == 1
+    manager.release(reused)
+    deadline = time.time() + 10
+    while manager.stats()['idle_sessions'] and time.time() < deadline:
+        time.sleep(0.1)
+    assert manager.stats()['idle_sessions'] == 0
+    assert not any(main.SFTPUtils.is_session_alive(session) for session in sessions)
+    assert manager.janitor is None
+    manager.close_all()
+
+
+def test_close_all_stops_the_janitor(sftp_server):
+    manager = main.SFTPSessionManager()
+    manager.release(manager.acquire(1))
+    assert manager.janitor is not None
+    manager.close_all()
+    assert manager.janitor is None
+    assert manager.stats()['idle_sessions'] == 0
+
+
+def test_reconnect_replaces_the_dropped_session(sftp_server):
+    manager = main.SFTPSessionManager()
+    sessions = manager.acquire(1)
+    dropped = sessions[0]
+    dropped[0].get_transport().close()
+    sftp = manager.reconnect_in(sessions)()
+    assert sessions[0] is not dropped
+    assert sessions[0][1] is sftp
+    assert main.SFTPUtils.is_sftp_alive(sftp)
+    manager.release(sessions)
+    manager.close_all()
@@ -0,0 +1,246 @@
+import os
+import threading
+import main
+
+
+class NullLogWindow:
+    def __getitem__(self, key):
+        return self
+
+    def update(self, value=None, append=True):
+        pass
+
+
+def test_failed_reconnect_closes_session_and_counts_file(tmp_path, sftp_server):
+    local_files = []
+    for name in ('a.csv.pgp', 'b.csv.pgp'):
+        local_file_path = tmp_path / name
+        local_file_path.write_bytes(b'x' * 1000)
+        local_files.append(str(local_file_path))
+    session = main.SFTPUtils.open_sftp_connection()
+    session[0].get_transport().close()  # Note: Dropped before the first upload
+
+    def reconnect():
+        raise IOError('host unreachable')
+
+    job = main.Job(1, 'upload')
+    failed_files = main.SFTPUtils.upload_files_concurrently(local_files, [session], NullLogWindow(), reconnect=reconnect, job=job)
+    assert sorted(str(reason) for _, reason in failed_files) == ['No SFTP session left to upload with', 'host unreachable']
+    assert job.done == job.total == 2
+    assert session[0].get_transport() is None  # Note: SSHClient.close() drops the transport
+
+
+def source_files(tmp_path, count):
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    filepaths = []
+    for index in range(count):
+        filepath = source_dir / f'file{index}.csv'
+        filepath.write_text(f'id,value\n{index},{index * 7}\n' * 50)
+        filepaths.append(str(filepath))
+    encrypted_dir = tmp_path / 'encrypted'
+    encrypted_dir.mkdir()
+    return filepaths, str(encrypted_dir)
+
+
+def test_pipeline_continues_after_a_failed_upload(tmp_path, sftp):
+    filepaths, encrypted_dir = source_files(tmp_path, 4)
+    (tmp_path / 'server' / 'upload' / 'file1.csv.pgp').mkdir()  # Note: The rename into place fails, the session stays up
+    uploaded_files, failed_files = main.PipelineUtils.encrypt_and_upload(filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1)
+    assert [filepath for filepath, _ in failed_files] == [filepaths[1]]
+    assert sorted(os.path.basename(f) for f in uploaded_files) == ['file0.csv.pgp', 'file2.csv.pgp', 'file3.csv.pgp']
+
+
+def test_pipeline_stops_when_the_session_is_lost(tmp_path, sftp):
+    filepaths, encrypted_dir = source_files(tmp_path, 3)
+    sftp.get_channel().get_transport().close()
+    uploaded_files, failed_files = main.PipelineUtils.encrypt_and_upload(filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1, queue_size=1)
+    assert uploaded_files == []
+    assert [filepath for filepath, _ in failed_files] == filepaths
+    lost = {'Not uploaded, the SFTP session was lost', 'Not encrypted, the SFTP session was lost'}
+    assert all(str(reason) in lost for _, reason in failed_files[1:])
+    for filepath, reason in failed_files:
+        if str(reason) != 'Not encrypted, the SFTP session was lost':
+            # Note: Encrypted files are recorded even when their upload never started
+            assert main.MANIFEST.execute("SELECT * FROM files WHERE source_path = ?", (os.path.abspath(filepath),))
+
+
+def test_pipeline_reconnects_when_the_session_is_lost(tmp_path, sftp):
+    filepaths, encrypted_dir = source_files(tmp_path, 3)
+    sftp.get_channel().get_transport().close()
+    sessions = []
+
+    def reconnect():
+        sessions.append(main.SFTPUtils.open_sftp_connection())
+        return sessions[-1][1]
+
+    try:
+        uploaded_files, failed_files = main.PipelineUtils.encrypt_and_upload(filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1, queue_size=1, reconnect=reconnect)
+    finally:
+        for client, session_sftp in sessions:
+            session_sftp.close()
+            client.close()
+    assert failed_files == []
+    assert len(uploaded_files) == 3
+    assert len(sessions) == 1  # Note: Only the first file found the session dropped
+    assert sorted(os.listdir(tmp_path / 'server' / 'upload')) == sorted(['SHA256SUMS'] + [os.path.basename(f) for f in uploaded_files])
+
+
+def test_pipeline_stops_when_reconnecting_fails(tmp_path, sftp):
+    filepaths, encrypted_dir = source_files(tmp_path, 3)
+    sftp.get_channel().get_transport().close()
+
+    def reconnect():
+        raise IOError("Connection refused")
+
+    uploaded_files, failed_files = main.PipelineUtils.encrypt_and_upload(filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1, queue_size=1, reconnect=reconnect)
+    assert uploaded_files == []
+    assert [filepath for filepath, _ in failed_files] == filepaths
+    assert str(failed_files[0][1]) == "Connection refused"
+
+
+def run_with_deadline(function, *args, **kwargs):
+    # Note: A spool wait that nothing can end fails the test instead of hanging it
+    result = {}
+
+    def run():
+        try:
+            result['value'] = function(*args, **kwargs)
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), f"{function.__name__} did not finish"
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def test_pipeline_spool_deletes_uploaded_files(tmp_path, sftp, spool, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SPOOL_MAX_BYTES', 5000)
+    filepaths, _ = source_files(tmp_path, 5)
+    uploaded_files, failed_files = run_with_deadline(main.PipelineUtils.encrypt_and_upload, filepaths, str(spool), sftp, NullLogWindow(), workers=1)
+    assert failed_files == []
+    assert len(uploaded_files) == 5
+    assert os.listdir(spool) == ['SHA256SUMS']
+    assert (spool / 'SHA256SUMS').read_text() == ''  # Note: Lines of deleted files are dropped with them
+    assert sorted(os.listdir(tmp_path / 'server' / 'upload')) == sorted(['SHA256SUMS'] + [os.path.basename(f) for f in uploaded_files])
+
+
+def test_pipeline_spool_full_of_leftovers_fails_fast(tmp_path, sftp, spool, monkeypatch):
+    monkeypatch.setattr(main.CONFIG, 'SPOOL_MAX_BYTES', 1000)
+    (spool / 'leftover.csv.pgp').write_bytes(b'x' * 1500)
+    filepaths, _ = source_files(tmp_path, 3)
+    uploaded_files, failed_files = run_with_deadline(main.PipelineUtils.encrypt_and_upload, filepaths, str(spool), sftp, NullLogWindow(), workers=2)
+    assert uploaded_files == []
+    assert [filepath for filepath, _ in failed_files] == filepaths
+    assert all('no upload in this run can free it' in reason for _, reason in failed_files)
+    assert os.listdir(spool) == ['leftover.csv.pgp']
+
+
+def test_spool_never_deletes_outside_its_folder(tmp_path, sftp_server, spool):
+    filepaths, encrypted_dir = source_files(tmp_path, 2)
+    encrypted_files, _ = main.EncryptionUtils.encrypt_batch(filepaths, encrypted_dir, NullLogWindow(), workers=1)
+    session = main.SFTPUtils.open_sftp_connection()
+    failed_files = main.SFTPUtils.upload_files_concurrently(encrypted_files, [session], NullLogWindow())
+    session[0].close()
+    assert failed_files == []
+    assert all(os.path.exists(f) for f in encrypted_files)
+
+
+def test_remote_checksums_keep_earlier_batches(tmp_path, sftp):
+    filepaths, encrypted_dir = source_files(tmp_path, 4)
+    for batch in (filepaths[:2], filepaths[2:]):
+        uploaded_files, failed_files = main.PipelineUtils.encrypt_and_upload(batch, encrypted_dir, sftp, NullLogWindow(), workers=1)
+        assert failed_files == []
+    remote_entries = main.ChecksumFile.parse(str(tmp_path / 'server' / 'upload' / 'SHA256SUMS'))
+    assert remote_entries == main.ChecksumFile.parse(os.path.join(encrypted_dir, 'SHA256SUMS'))
+    assert sorted(remote_entries) == [f'file{index}.csv.pgp' for index in range(4)]
+
+
+def test_pipeline_source_moved_after_encryption(tmp_path, sftp, monkeypatch):
+    filepaths, encrypted_dir = source_files(tmp_path, 3)
+    record_encrypted = main.MANIFEST.record_encrypted
+
+    def moved_away(source_path, *args, **kwargs):
+        if source_path == filepaths[1]:
+            raise FileNotFoundError(source_path)
+        return record_encrypted(source_path, *args, **kwargs)
+
+    monkeypatch.setattr(main.MANIFEST, 'record_encrypted', moved_away)
+    uploaded_files, failed_files = run_with_deadline(main.PipelineUtils.encrypt_and_upload, filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1)
+    assert [filepath for filepath, _ in failed_files] == [filepaths[1]]
+    assert len(uploaded_files) == 2
+
+
+class BrokenLogWindow(NullLogWindow):
+    def update(self, value=None, append=True):
+        if 'SOURCE FILE' in str(value):
+            raise RuntimeError('log pane gone')
+
+
+def test_pipeline_consumer_error_stops_producer(tmp_path, sftp):
+    filepaths, encrypted_dir = source_files(tmp_path, 6)
+    try:
+        run_with_deadline(main.PipelineUtils.encrypt_and_upload, filepaths, encrypted_dir, sftp, BrokenLogWindow(), workers=2, queue_size=1)
+    except RuntimeError as e:
+        assert str(e) == 'log pane gone'
+    else:
+        raise AssertionError('the consumer error was swallowed')
+    assert not any(thread.name == 'encrypt-producer' for thread in threading.enumerate())
+
+
+def test_manifest_plan_follows_the_source_and_its_upload(tmp_path, sftp, monkeypatch):
+    filepaths, encrypted_dir = source_files(tmp_path, 2)
+    uploaded_files, _ = main.PipelineUtils.encrypt_and_upload(filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1, incremental=True)
+    encrypted_path = os.path.abspath(uploaded_files[0])
+    assert main.MANIFEST.plan(filepaths[0]) == ('skip', encrypted_path)
+    stat = os.stat(filepaths[0])
+    os.utime(filepaths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert main.MANIFEST.plan(filepaths[0]) == ('skip', encrypted_path)  # Note: Touched only, settled on the content hash
+    assert main.MANIFEST.lookup(filepaths[0])['mtime_ns'] == stat.st_mtime_ns + 10 ** 9
+    main.MANIFEST.execute("UPDATE files SET remote_size = NULL WHERE source_path = ?", (os.path.abspath(filepaths[0]),), commit=True)
+    assert main.MANIFEST.plan(filepaths[0]) == ('upload', encrypted_path)
+    monkeypatch.setattr(main.CONFIG, 'ENCRYPTION_FORMAT', 'binary')
+    assert main.MANIFEST.plan(filepaths[0]) == ('encrypt', None)  # Note: An .asc/.pgp file is not uploaded as a .gpg run's output
+    monkeypatch.setattr(main.CONFIG, 'ENCRYPTION_FORMAT', None)
+    os.remove(encrypted_path)
+    assert main.MANIFEST.plan(filepaths[0]) == ('encrypt', None)
+    text = open(filepaths[1]).read()
+    with open(filepaths[1], 'w') as f:
+        f.write(text.replace('1,7', '1,8'))  # Note: Same size, new content
+    assert main.MANIFEST.plan(filepaths[1]) == ('encrypt', None)
+    uploaded_files, failed_files = main.PipelineUtils.encrypt_and_upload(filepaths, encrypted_dir, sftp, NullLogWindow(), workers=1, incremental=True)
+    assert failed_files == []
+    assert sorted(os.path.basename(f) for f in uploaded_files) == ['file0.csv.pgp', 'file1.csv.pgp']
+    assert [main.MANIFEST.plan(filepath)[0] for filepath in filepaths] == ['skip', 'skip']
+
+
+def test_stat_cache_answers_the_upload_checks(tmp_path, sftp, monkeypatch):
+    local_file = tmp_path / 'a.csv.pgp'
+    local_file.write_bytes(os.urandom(5000))
+    cache = main.RemoteStatCache()
+    assert cache.try_refresh([(None, sftp)])
+    stat_calls = []
+    stat = type(sftp).stat
+    monkeypatch.setattr(type(sftp), 'stat', lambda self, path: stat_calls.append(path) or stat(self, path))
+    assert main.SFTPUtils.upload_file_to_sftp(str(local_file), 'a.csv.pgp', sftp, NullLogWindow(), stat_cache=cache) == 5000
+    assert stat_calls == []
+    assert cache.size('a.csv.pgp') == 5000
+    assert not cache.exists('a.csv.pgp' + main.CONFIG.SFTP_PARTIAL_SUFFIX)
+
+
+def test_stat_cache_that_cannot_list_falls_back_to_stat(tmp_path, sftp, monkeypatch):
+    local_file = tmp_path / 'a.csv.pgp'
+    local_file.write_bytes(os.urandom(5000))
+    (tmp_path / 'server' / 'upload' / 'a.csv.pgp.part').write_bytes(local_file.read_bytes()[:3000])
+    cache = main.RemoteStatCache()
+    dead = main.SFTPUtils.open_sftp_connection()
+    dead[0].close()
+    assert not cache.try_refresh([dead])
+    assert not cache.loaded
+    offset, _, _ = main.SFTPUtils.resumable_put(str(local_file), 'a.csv.pgp', sftp, cache)
+    assert offset == 3000  # Note: The partial file was found by stat and resumed
+    assert (tmp_path / 'server' / 'upload' / 'a.csv.pgp').read_bytes() == local_file.read_bytes()